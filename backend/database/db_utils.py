@@ -4,11 +4,14 @@ Handles PostgreSQL connection, CSV data loading, and common database operations.
 """
 
 import os
+import csv
 import asyncio
-import pandas as pd
 import asyncpg
+import pandas as pd
 from datetime import datetime, date
-from typing import List, Dict, Optional, Tuple
+from functools import lru_cache
+from itertools import islice, product
+from typing import Iterable, Iterator, List, Dict, Optional, Tuple
 from pathlib import Path
 import logging
 
@@ -66,15 +69,17 @@ class DatabaseManager:
             await self.pool.close()
             logger.info("Database connection closed")
     
-    async def execute_query(self, query: str, *args) -> List[Dict]:
-        """Execute a query and return results."""
+    async def execute_query(self, query: str, *args) -> List[asyncpg.Record]:
+        """
+        Execute a query and return results.
+        NOTE: Records support key access and dict(record); they are returned as-is to avoid per-row copies
+        """
         if not self.pool:
             await self.connect()
         
         async with self.pool.acquire() as connection:
             try:
-                rows = await connection.fetch(query, *args)
-                return [dict(row) for row in rows]
+                return await connection.fetch(query, *args)
             except Exception as e:
                 logger.error(f"Query execution failed: {e}")
                 raise
@@ -93,65 +98,111 @@ class DatabaseManager:
                 logger.error(f"Command execution failed: {e}")
                 raise
 
+# NOTE: Rows per chunk when streaming CSV files; bounds memory regardless of file size
+CSV_CHUNK_SIZE = 50_000
+
+def _iter_csv(csv_path: str, required_cols: List[str]) -> Iterator[Tuple[str, ...]]:
+    """
+    Stream the required columns of each CSV row as whitespace-stripped strings.
+    Blank lines are skipped and missing trailing fields read as empty strings.
+    """
+    # utf-8-sig strips a byte order mark, which would otherwise corrupt the first header name
+    with open(csv_path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        header = [col.strip() for col in next(reader, [])]
+        
+        # Validate required columns
+        missing_cols = [col for col in required_cols if col not in header]
+        if missing_cols:
+            raise ValueError(f"Missing required columns: {missing_cols}")
+        
+        indices = [header.index(col) for col in required_cols]
+        for row in reader:
+            if not any(field.strip() for field in row):
+                continue
+            yield tuple(row[i].strip() if i < len(row) else '' for i in indices)
+
+def _chunked(rows: Iterable[Tuple], size: int) -> Iterator[List[Tuple]]:
+    """Group an iterable into lists of at most `size` items."""
+    iterator = iter(rows)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+def _parse_date(value: str) -> Optional[date]:
+    """
+    Parse a date or timestamp string to a date, returning None if empty or invalid.
+    ISO 8601 values take the fast path; other formats pandas recognises (e.g. 01/02/2024, month first) are still accepted.
+    """
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value).date()
+    except ValueError:
+        return _parse_non_iso_date(value)
+
+@lru_cache(maxsize=65_536)
+def _parse_non_iso_date(value: str) -> Optional[date]:
+    """
+    Slow-path date parsing through pandas, returning None if invalid.
+    NOTE: Memoized; date strings repeat heavily across rows, so each distinct value is parsed once
+    """
+    try:
+        parsed = pd.to_datetime(value)
+    except (ValueError, OverflowError):
+        return None
+    return None if parsed is pd.NaT else parsed.date()
+
 class CSVDataLoader:
     """Handles loading CSV data into PostgreSQL tables."""
     
-    def __init__(self, db_manager: DatabaseManager):
+    def __init__(self, db_manager: DatabaseManager, use_copy: bool = True):
+        """
+        Args:
+            db_manager: Connected database manager
+            use_copy: COPY through staging tables; set False to use pipelined
+                INSERT ... ON CONFLICT batches (e.g. when temp tables are not permitted)
+        """
         self.db_manager = db_manager
+        self.use_copy = use_copy
     
     async def load_transfers_csv(self, csv_path: str) -> int:
         """
-        Load transfers.csv data into the transfers table.
+        Load transfers.csv data into the transfers table, streaming the file in chunks.
         Returns number of records inserted.
         """
         try:
-            # Read CSV file
-            df = pd.read_csv(csv_path)
-            logger.info(f"Loading {len(df)} transfer records from {csv_path}")
-            
-            # Validate required columns
+            logger.info(f"Loading transfer records from {csv_path}")
             required_cols = ['transfer_id', 'patient_id', 'ward_in_time', 'ward_out_time', 'location']
-            missing_cols = [col for col in required_cols if col not in df.columns]
-            if missing_cols:
-                raise ValueError(f"Missing required columns: {missing_cols}")
-            
-            # Data preprocessing
-            df['ward_in_time'] = pd.to_datetime(df['ward_in_time']).dt.date
-            df['ward_out_time'] = pd.to_datetime(df['ward_out_time'], errors='coerce').dt.date
-            
-            # Clean string fields
-            df['transfer_id'] = df['transfer_id'].astype(str).str.strip()
-            df['patient_id'] = df['patient_id'].astype(str).str.strip()
-            df['location'] = df['location'].astype(str).str.strip()
-            
-            # Remove duplicates
-            df = df.drop_duplicates(subset=['transfer_id'])
-            
-            # Insert patient IDs first (to satisfy foreign key constraint)
-            unique_patients = df['patient_id'].unique()
-            await self._insert_patients(unique_patients)
+            seen_ids = set()
+            invalid_dates = 0
             
-            # Insert transfers
             records_inserted = 0
             async with self.db_manager.pool.acquire() as connection:
                 async with connection.transaction():
-                    for _, row in df.iterrows():
-                        try:
-                            await connection.execute("""
-                                INSERT INTO transfers (transfer_id, patient_id, ward_in_time, ward_out_time, location)
-                                VALUES ($1, $2, $3, $4, $5)
-                                ON CONFLICT (transfer_id) DO NOTHING
-                            """, 
-                            row['transfer_id'],
-                            row['patient_id'],
-                            row['ward_in_time'],
-                            row['ward_out_time'] if pd.notna(row['ward_out_time']) else None,
-                            row['location']
-                            )
-                            records_inserted += 1
-                        except Exception as e:
-                            logger.warning(f"Skipped transfer {row['transfer_id']}: {e}")
+                    await self._disable_synchronous_commit(connection)
+                    for chunk in _chunked(_iter_csv(csv_path, required_cols), CSV_CHUNK_SIZE):
+                        # Validate dates and remove duplicates
+                        records = []
+                        for transfer_id, patient_id, ward_in_time, ward_out_time, location in chunk:
+                            ward_in_date = _parse_date(ward_in_time)
+                            if ward_in_date is None:
+                                invalid_dates += 1
+                                continue
+                            if transfer_id in seen_ids:
+                                continue
+                            seen_ids.add(transfer_id)
+                            records.append((transfer_id, patient_id, ward_in_date, _parse_date(ward_out_time), location))
+                        
+                        # Insert patient IDs first (to satisfy foreign key constraint)
+                        await self._insert_patients({record[1] for record in records})
+                        
+                        # Insert transfers in bulk
+                        records_inserted += await self._bulk_insert(
+                            connection, 'transfers', required_cols, records, conflict_column='transfer_id'
+                        )
             
+            if invalid_dates:
+                logger.warning(f"Found {invalid_dates} records with invalid ward_in_time, skipped")
             logger.info(f"Successfully loaded {records_inserted} transfer records")
             return records_inserted
             
@@ -161,93 +212,193 @@ class CSVDataLoader:
     
     async def load_microbiology_csv(self, csv_path: str) -> int:
         """
-        Load microbiology.csv data into the microbiology table.
+        Load microbiology.csv data into the microbiology table, streaming the file in chunks.
         Returns number of records inserted.
         """
         try:
-            # Read CSV file
-            df = pd.read_csv(csv_path)
-            logger.info(f"Loading {len(df)} microbiology records from {csv_path}")
-            
-            # Validate required columns
+            logger.info(f"Loading microbiology records from {csv_path}")
             required_cols = ['test_id', 'patient_id', 'collection_date', 'infection', 'result']
-            missing_cols = [col for col in required_cols if col not in df.columns]
-            if missing_cols:
-                raise ValueError(f"Missing required columns: {missing_cols}")
-            
-            # Data preprocessing
-            df['collection_date'] = pd.to_datetime(df['collection_date']).dt.date
-            
-            # Clean string fields
-            df['test_id'] = df['test_id'].astype(str).str.strip()
-            df['patient_id'] = df['patient_id'].astype(str).str.strip()
-            df['infection'] = df['infection'].astype(str).str.strip()
-            df['result'] = df['result'].astype(str).str.strip().str.lower()
-            
-            # Validate result values
-            valid_results = ['positive', 'negative']
-            invalid_results = df[~df['result'].isin(valid_results)]
-            if len(invalid_results) > 0:
-                logger.warning(f"Found {len(invalid_results)} records with invalid results, skipping...")
-                df = df[df['result'].isin(valid_results)]
-            
-            # Remove duplicates
-            df = df.drop_duplicates(subset=['test_id'])
-            
-            # Insert patient IDs first (to satisfy foreign key constraint)
-            unique_patients = df['patient_id'].unique()
-            await self._insert_patients(unique_patients)
+            valid_results = {'positive', 'negative'}
+            seen_ids = set()
+            invalid_results = 0
+            invalid_dates = 0
             
-            # Insert microbiology tests
             records_inserted = 0
             async with self.db_manager.pool.acquire() as connection:
                 async with connection.transaction():
-                    for _, row in df.iterrows():
-                        try:
-                            await connection.execute("""
-                                INSERT INTO microbiology (test_id, patient_id, collection_date, infection, result)
-                                VALUES ($1, $2, $3, $4, $5)
-                                ON CONFLICT (test_id) DO NOTHING
-                            """,
-                            row['test_id'],
-                            row['patient_id'],
-                            row['collection_date'],
-                            row['infection'],
-                            row['result']
-                            )
-                            records_inserted += 1
-                        except Exception as e:
-                            logger.warning(f"Skipped test {row['test_id']}: {e}")
+                    await self._disable_synchronous_commit(connection)
+                    for chunk in _chunked(_iter_csv(csv_path, required_cols), CSV_CHUNK_SIZE):
+                        # Validate results and dates, remove duplicates
+                        records = []
+                        for test_id, patient_id, collection_date, infection, result in chunk:
+                            result = result.lower()
+                            if result not in valid_results:
+                                invalid_results += 1
+                                continue
+                            collection_day = _parse_date(collection_date)
+                            if collection_day is None:
+                                invalid_dates += 1
+                                continue
+                            if test_id in seen_ids:
+                                continue
+                            seen_ids.add(test_id)
+                            records.append((test_id, patient_id, collection_day, infection, result))
+                        
+                        # Insert patient IDs first (to satisfy foreign key constraint)
+                        await self._insert_patients({record[1] for record in records})
+                        
+                        # Insert microbiology tests in bulk
+                        records_inserted += await self._bulk_insert(
+                            connection, 'microbiology', required_cols, records, conflict_column='test_id'
+                        )
             
+            if invalid_results:
+                logger.warning(f"Found {invalid_results} records with invalid results, skipped")
+            if invalid_dates:
+                logger.warning(f"Found {invalid_dates} records with invalid collection_date, skipped")
             logger.info(f"Successfully loaded {records_inserted} microbiology records")
-            
-            # Refresh materialized view after loading data
-            await self._refresh_materialized_view()
-            
             return records_inserted
             
         except Exception as e:
             logger.error(f"Failed to load microbiology CSV: {e}")
             raise
     
-    async def _insert_patients(self, patient_ids: List[str]) -> None:
-        """Insert unique patient IDs into patients table."""
-        async with self.db_manager.pool.acquire() as connection:
-            async with connection.transaction():
-                for patient_id in patient_ids:
-                    await connection.execute("""
-                        INSERT INTO patients (patient_id) VALUES ($1)
-                        ON CONFLICT (patient_id) DO NOTHING
-                    """, patient_id)
+    async def _insert_patients(self, patient_ids: Iterable[str]) -> None:
+        """Insert unique patient IDs into patients table in a single statement."""
+        # NOTE: Both loaders run concurrently; a fixed key order keeps their row locks from deadlocking
+        await self.db_manager.execute_command("""
+            INSERT INTO patients (patient_id)
+            SELECT UNNEST($1::text[])
+            ON CONFLICT (patient_id) DO NOTHING
+        """, sorted(patient_ids))
+    
+    async def _disable_synchronous_commit(self, connection: asyncpg.Connection) -> None:
+        """
+        Skip waiting for the WAL flush on commit for the current load transaction only.
+        NOTE: A crash can lose the last commit, but loads are idempotent and can be re-run
+        """
+        await connection.execute("SET LOCAL synchronous_commit TO OFF")
+    
+    async def _bulk_insert(
+        self,
+        connection: asyncpg.Connection,
+        table: str,
+        columns: List[str],
+        records: Iterable[Tuple],
+        conflict_column: str
+    ) -> int:
+        """Insert records with COPY or executemany depending on loader configuration."""
+        if self.use_copy:
+            return await self._copy_and_merge(connection, table, columns, records, conflict_column)
+        return await self._execute_many(connection, table, columns, records, conflict_column)
+    
+    async def _execute_many(
+        self,
+        connection: asyncpg.Connection,
+        table: str,
+        columns: List[str],
+        records: Iterable[Tuple],
+        conflict_column: str
+    ) -> int:
+        """
+        Insert records as one pipelined executemany batch of INSERT ... ON CONFLICT DO NOTHING.
+        Returns number of records submitted (executemany does not report per-row status).
+        """
+        rows = list(records)
+        column_list = ", ".join(columns)
+        placeholders = ", ".join(f"${i}" for i in range(1, len(columns) + 1))
+        
+        # asyncpg prepares the statement once per connection and reuses it from its statement cache
+        try:
+            await connection.executemany(f"""
+                INSERT INTO {table} ({column_list})
+                VALUES ({placeholders})
+                ON CONFLICT ({conflict_column}) DO NOTHING
+            """, rows)
+        except Exception as e:
+            logger.error(f"Batch insert of {len(rows)} {table} records failed: {e}")
+            raise
+        
+        return len(rows)
+    
+    async def _copy_and_merge(
+        self,
+        connection: asyncpg.Connection,
+        table: str,
+        columns: List[str],
+        records: Iterable[Tuple],
+        conflict_column: str
+    ) -> int:
+        """
+        COPY records into a transaction-scoped staging table, then merge them into the target table.
+        NOTE: Must run inside a transaction; keeps ON CONFLICT DO NOTHING semantics of row inserts.
+        Temp tables are not WAL-logged, so only the final merge into the target table writes WAL.
+        The staging table is reused (and emptied) across chunks of the same transaction.
+        Returns number of records inserted.
+        """
+        staging_table = f"tmp_{table}"
+        column_list = ", ".join(columns)
+        
+        await connection.execute(f"""
+            CREATE TEMP TABLE IF NOT EXISTS {staging_table} (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP
+        """)
+        await connection.copy_records_to_table(staging_table, records=records, columns=columns)
+        result = await connection.execute(f"""
+            INSERT INTO {table} ({column_list})
+            SELECT {column_list} FROM {staging_table}
+            ON CONFLICT ({conflict_column}) DO NOTHING
+        """)
+        await connection.execute(f"TRUNCATE {staging_table}")
+        
+        # Command tag is "INSERT 0 <rows>"
+        return int(result.split()[-1])
     
-    async def _refresh_materialized_view(self) -> None:
-        """Refresh the materialized view for cluster detection."""
+    async def refresh_materialized_view(self) -> None:
+        """
+        Refresh the materialized view for cluster detection.
+        NOTE: Call once after all CSV loads complete, not per file
+        """
         try:
             await self.db_manager.execute_command("SELECT refresh_patient_infection_timeline()")
             logger.info("Materialized view refreshed successfully")
         except Exception as e:
             logger.warning(f"Failed to refresh materialized view: {e}")
 
+def _build_positive_cases_query(by_infection: bool, by_start_date: bool, by_end_date: bool) -> str:
+    """Build the positive cases query for one combination of optional filters."""
+    conditions = []
+    if by_infection:
+        conditions.append("pit.infection = ${}")
+    if by_start_date:
+        conditions.append("pit.infection_date >= ${}")
+    if by_end_date:
+        conditions.append("pit.infection_date <= ${}")
+    where_clause = " AND ".join(
+        condition.format(param_idx) for param_idx, condition in enumerate(conditions, start=1)
+    )
+    
+    query = """
+        SELECT 
+            pit.patient_id,
+            pit.infection,
+            pit.infection_date,
+            pit.location,
+            pit.ward_in_time,
+            pit.ward_out_time,
+            pit.infection_during_stay
+        FROM patient_infection_timeline pit
+        """
+    if where_clause:
+        query += f"WHERE {where_clause}\n        "
+    query += "ORDER BY pit.infection_date, pit.infection, pit.location"
+    return query
+
+# NOTE: One fixed SQL string per filter shape, so asyncpg's statement cache is reused across calls
+_POSITIVE_CASES_QUERIES: Dict[Tuple[bool, bool, bool], str] = {
+    shape: _build_positive_cases_query(*shape)
+    for shape in product((False, True), repeat=3)
+}
+
 class ClusterQueryBuilder:
     """Builds optimized queries for infection cluster detection."""
     
@@ -259,41 +410,12 @@ class ClusterQueryBuilder:
         infection_type: Optional[str] = None,
         start_date: Optional[date] = None,
         end_date: Optional[date] = None
-    ) -> List[Dict]:
+    ) -> List[asyncpg.Record]:
         """Get all positive cases with location and timing information."""
-        
-        query = """
-        SELECT 
-            pit.patient_id,
-            pit.infection,
-            pit.infection_date,
-            pit.location,
-            pit.ward_in_time,
-            pit.ward_out_time,
-            pit.infection_during_stay
-        FROM patient_infection_timeline pit
-        WHERE 1=1
-        """
-        
-        params = []
-        param_idx = 1
-        
-        if infection_type:
-            query += f" AND pit.infection = ${param_idx}"
-            params.append(infection_type)
-            param_idx += 1
-        
-        if start_date:
-            query += f" AND pit.infection_date >= ${param_idx}"
-            params.append(start_date)
-            param_idx += 1
-        
-        if end_date:
-            query += f" AND pit.infection_date <= ${param_idx}"
-            params.append(end_date)
-            param_idx += 1
-        
-        query += " ORDER BY pit.infection_date, pit.infection, pit.location"
+        # Dispatch to the precomputed statement for this filter shape
+        filters = (infection_type, start_date, end_date)
+        query = _POSITIVE_CASES_QUERIES[tuple(bool(value) for value in filters)]
+        params = [value for value in filters if value]
         
         return await self.db_manager.execute_query(query, *params)
     
@@ -302,7 +424,7 @@ class ClusterQueryBuilder:
         infection_type: str,
         contact_window_days: int = 14,
         min_cluster_size: int = 2
-    ) -> List[Dict]:
+    ) -> List[asyncpg.Record]:
         """
         Find spatial-temporal clusters based on overlapping stays and infection timing.
         
@@ -312,6 +434,8 @@ class ClusterQueryBuilder:
             min_cluster_size: Minimum number of patients for a cluster
         """
         
+        # NOTE: Overlap and time-window predicates sit in the join condition so the planner can
+        # range-scan the (infection, location, infection_date) index; each pair is visited once
         query = """
         WITH infection_contacts AS (
             SELECT 
@@ -320,34 +444,30 @@ class ClusterQueryBuilder:
                 pit1.infection_date as infection_date_1,
                 pit2.infection_date as infection_date_2,
                 pit1.location,
-                CASE 
-                    WHEN pit1.ward_in_time <= pit2.ward_out_time 
-                    AND pit2.ward_in_time <= pit1.ward_out_time
-                    THEN true 
-                    ELSE false 
-                END as location_overlap,
                 ABS(pit1.infection_date - pit2.infection_date) as days_between_infections
             FROM patient_infection_timeline pit1
             JOIN patient_infection_timeline pit2 
-                ON pit1.location = pit2.location 
-                AND pit1.patient_id != pit2.patient_id
-                AND pit1.infection = pit2.infection
+                ON pit2.infection = pit1.infection
+                AND pit2.location = pit1.location
+                AND pit2.infection_during_stay = true
+                AND pit2.infection_date BETWEEN pit1.infection_date - $2::int AND pit1.infection_date + $2::int
+                AND pit1.patient_id < pit2.patient_id
+                AND pit1.ward_in_time <= pit2.ward_out_time
+                AND pit2.ward_in_time <= pit1.ward_out_time
             WHERE pit1.infection = $1
             AND pit1.infection_during_stay = true
-            AND pit2.infection_during_stay = true
         ),
         potential_clusters AS (
             SELECT 
-                location,
-                COUNT(DISTINCT patient_1) + COUNT(DISTINCT patient_2) as cluster_size,
-                MIN(LEAST(infection_date_1, infection_date_2)) as cluster_start,
-                MAX(GREATEST(infection_date_1, infection_date_2)) as cluster_end,
-                AVG(days_between_infections) as avg_days_between
-            FROM infection_contacts
-            WHERE location_overlap = true
-            AND days_between_infections <= $2
-            GROUP BY location
-            HAVING COUNT(DISTINCT patient_1) + COUNT(DISTINCT patient_2) >= $3
+                ic.location,
+                COUNT(DISTINCT contact.patient_id) as cluster_size,
+                MIN(LEAST(ic.infection_date_1, ic.infection_date_2)) as cluster_start,
+                MAX(GREATEST(ic.infection_date_1, ic.infection_date_2)) as cluster_end,
+                AVG(ic.days_between_infections) as avg_days_between
+            FROM infection_contacts ic
+            CROSS JOIN LATERAL (VALUES (ic.patient_1), (ic.patient_2)) AS contact(patient_id)
+            GROUP BY ic.location
+            HAVING COUNT(DISTINCT contact.patient_id) >= $3
         )
         SELECT 
             location,
@@ -371,7 +491,7 @@ class ClusterQueryBuilder:
         self,
         start_date: Optional[date] = None,
         end_date: Optional[date] = None
-    ) -> List[Dict]:
+    ) -> List[asyncpg.Record]:
         """Get infection statistics by location."""
         
         query = """
@@ -412,11 +532,19 @@ async def main():
         # Load CSV files (adjust paths as needed)
         data_dir = Path("../../data")
         
+        loads = []
         if (data_dir / "transfers.csv").exists():
-            await csv_loader.load_transfers_csv(str(data_dir / "transfers.csv"))
+            loads.append(csv_loader.load_transfers_csv(str(data_dir / "transfers.csv")))
         
         if (data_dir / "microbiology.csv").exists():
-            await csv_loader.load_microbiology_csv(str(data_dir / "microbiology.csv"))
+            loads.append(csv_loader.load_microbiology_csv(str(data_dir / "microbiology.csv")))
+        
+        # Files are independent, so load them concurrently on separate pool connections
+        if loads:
+            await asyncio.gather(*loads)
+            
+            # Refresh materialized view once after loading data
+            await csv_loader.refresh_materialized_view()
         
         # Example cluster detection queries
         query_builder = ClusterQueryBuilder(db_manager)
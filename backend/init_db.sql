@@ -8,6 +8,9 @@ CREATE USER infection_app WITH PASSWORD 'secure_password_here';
 GRANT CONNECT ON DATABASE infection_clusters TO infection_app;
 GRANT USAGE ON SCHEMA public TO infection_app;
 
+-- Enable btree_gist for the (location, stay) GiST index on transfers
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+
 -- Grant table privileges (tables will be created by SQLAlchemy)
 ALTER DEFAULT PRIVILEGES IN SCHEMA public GRANT SELECT, INSERT, UPDATE, DELETE ON TABLES TO infection_app;
 ALTER DEFAULT PRIVILEGES IN SCHEMA public GRANT USAGE ON SEQUENCES TO infection_app;
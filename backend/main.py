@@ -1,27 +1,37 @@
 from fastapi import FastAPI, File, UploadFile, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy import and_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from contextlib import asynccontextmanager
 from typing import List, Dict, Any
+import asyncio
 import os
-from database import get_db, create_tables, test_connection
-from services.cluster_detection import parse_and_store_csv, find_clusters_from_db, get_cluster_statistics
+from database import (
+    async_engine, engine, get_db, get_sync_db, create_tables, check_connection, warm_connection_pool
+)
+from services.cluster_detection import parse_and_store_csv, find_clusters_cached, get_cluster_statistics
 from models import Transfer, Microbiology
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Verify connection, initialize database tables and warm the connection pool before serving."""
+    if not await check_connection():
+        raise RuntimeError("Database connection failed")
+    await asyncio.to_thread(create_tables)
+    await warm_connection_pool()
+    yield
+    await async_engine.dispose()
+    engine.dispose()
+
 # NOTE: Initialize FastAPI with PostgreSQL backend for medical data persistence
 app = FastAPI(
     title="Infection Cluster Detection API",
     description="Medical data processing system for hospital infection cluster detection",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
-# Initialize database on startup
-@app.on_event("startup")
-async def startup_event():
-    """Initialize database tables and verify connection on startup."""
-    if not test_connection():
-        raise HTTPException(status_code=500, detail="Database connection failed")
-    create_tables()
-
 # NOTE: CORS configuration for Angular frontend communication
 app.add_middleware(
     CORSMiddleware,
@@ -37,7 +47,7 @@ app.add_middleware(
 @app.post("/upload/")
 async def upload_files(
     files: List[UploadFile] = File(...), 
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_sync_db)
 ) -> Dict[str, Any]:
     """
     Upload and process CSV files, storing data in PostgreSQL database.
@@ -60,19 +70,17 @@ async def upload_files(
         )
     
     try:
-        # Read file contents
-        transfers_content = None
-        microbiology_content = None
+        # Stream the spooled upload files rather than reading them into memory
+        uploads = {file.filename: file.file for file in files}
         
-        for file in files:
-            content = await file.read()
-            if file.filename == "transfers.csv":
-                transfers_content = content
-            elif file.filename == "microbiology.csv":
-                microbiology_content = content
-        
-        # Parse and store in database
-        result = parse_and_store_csv(db, transfers_content, microbiology_content)
+        # Parse and store in database on a worker thread to keep the event loop responsive
+        result = await asyncio.get_running_loop().run_in_executor(
+            None,
+            parse_and_store_csv,
+            db,
+            uploads["transfers.csv"],
+            uploads["microbiology.csv"]
+        )
         
         return {
             "message": "Files uploaded and processed successfully",
@@ -87,24 +95,29 @@ async def upload_files(
 
 
 @app.get("/clusters/")
-async def get_clusters(db: Session = Depends(get_db)) -> Dict[str, Any]:
+async def get_clusters(
+    db: AsyncSession = Depends(get_db),
+    sync_db: Session = Depends(get_sync_db)
+) -> Dict[str, Any]:
     """
     Detect infection clusters from database using optimized queries.
     NOTE: Database-driven cluster detection for clinical analysis
     """
     try:
-        # Check if data exists in database
-        transfer_count = db.query(Transfer).count()
-        microbiology_count = db.query(Microbiology).count()
+        # Check if data exists in database (EXISTS stops at the first row)
+        has_data = await db.scalar(select(and_(
+            select(Transfer.transfer_id).exists(),
+            select(Microbiology.test_id).exists()
+        )))
         
-        if transfer_count == 0 or microbiology_count == 0:
+        if not has_data:
             raise HTTPException(
                 status_code=400, 
                 detail="No data found. Please upload the CSV files first."
             )
         
-        # Detect clusters using database queries
-        clusters = find_clusters_from_db(db)
+        # Detect clusters on a worker thread; run_sync would keep the CPU-bound linking on the event loop
+        clusters = await asyncio.to_thread(find_clusters_cached, sync_db)
         
         # Transform to match frontend expectations (simplified format)
         simplified_clusters = {}
@@ -123,13 +136,13 @@ async def get_clusters(db: Session = Depends(get_db)) -> Dict[str, Any]:
 
 
 @app.get("/statistics/")
-async def get_statistics(db: Session = Depends(get_db)) -> Dict[str, Any]:
+async def get_statistics(db: Session = Depends(get_sync_db)) -> Dict[str, Any]:
     """
     Get comprehensive statistics about the stored data and detected clusters.
     NOTE: Analytics endpoint for clinical dashboard insights
     """
     try:
-        stats = get_cluster_statistics(db)
+        stats = await asyncio.to_thread(get_cluster_statistics, db)
         return stats
     except Exception as e:
         raise HTTPException(
@@ -144,7 +157,7 @@ async def health_check() -> Dict[str, str]:
     Health check endpoint for monitoring database connectivity.
     NOTE: System health monitoring for medical application reliability
     """
-    db_status = "healthy" if test_connection() else "unhealthy"
+    db_status = "healthy" if await check_connection() else "unhealthy"
     return {
         "status": "healthy" if db_status == "healthy" else "degraded",
         "database": db_status,
@@ -1,5 +1,5 @@
 # NOTE: SQLAlchemy models matching DATABASE.md schema for medical data integrity
-from sqlalchemy import Column, String, DateTime, CheckConstraint, Index
+from sqlalchemy import Column, Integer, String, DateTime, CheckConstraint, Index, text
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
 
@@ -18,13 +18,23 @@ class Transfer(Base):
     
     __table_args__ = (
         CheckConstraint('ward_out_time >= ward_in_time', name='chk_transfer_dates'),
-        CheckConstraint("transfer_id ~ '^T[A-Z0-9]+$'", name='chk_transfer_id_format'),
-        CheckConstraint("patient_id ~ '^P[0-9]+$'", name='chk_patient_id_format'),
+        # Regex (~) checks are PostgreSQL syntax; other backends skip them
+        CheckConstraint("transfer_id ~ '^T[A-Z0-9]+$'", name='chk_transfer_id_format').ddl_if(dialect='postgresql'),
+        CheckConstraint("patient_id ~ '^P[0-9]+$'", name='chk_patient_id_format').ddl_if(dialect='postgresql'),
         Index('idx_transfers_location_time', 'location', 'ward_in_time', 'ward_out_time'),
         Index('idx_transfers_time_range', 'ward_in_time', 'ward_out_time'),
         Index('idx_transfers_patient_location', 'patient_id', 'location', 'ward_in_time', 'ward_out_time'),
     )
 
+# NOTE: PostgreSQL-only inclusive stay interval for range-overlap (&&) queries and its GiST index
+# (btree_gist, see init_db.sql); kept out of the declarative columns so create_all also works on SQLite
+TRANSFER_STAY_INDEX_NAME = 'idx_transfers_location_stay'
+TRANSFER_STAY_COLUMN_DDL = """
+    ALTER TABLE transfers ADD COLUMN IF NOT EXISTS stay tsrange
+        GENERATED ALWAYS AS (tsrange(ward_in_time, ward_out_time, '[]')) STORED
+"""
+TRANSFER_STAY_INDEX_DDL = f"CREATE INDEX IF NOT EXISTS {TRANSFER_STAY_INDEX_NAME} ON transfers USING gist (location, stay)"
+
 class Microbiology(Base):
     """Infection test results and collection metadata."""
     __tablename__ = "microbiology"
@@ -38,8 +48,20 @@ class Microbiology(Base):
     
     __table_args__ = (
         CheckConstraint("result IN ('positive', 'negative')", name='chk_test_result'),
-        CheckConstraint("test_id ~ '^M[A-Z0-9]+$'", name='chk_test_id_format'),
-        CheckConstraint("patient_id ~ '^P[0-9]+$'", name='chk_patient_id_format'),
-        Index('idx_microbiology_infection_result', 'infection', 'result'),
+        CheckConstraint("test_id ~ '^M[A-Z0-9]+$'", name='chk_test_id_format').ddl_if(dialect='postgresql'),
+        CheckConstraint("patient_id ~ '^P[0-9]+$'", name='chk_patient_id_format').ddl_if(dialect='postgresql'),
+        # Partial: cluster detection only reads positive tests
+        Index('idx_microbiology_infection_result', 'infection', 'result', postgresql_where=text("result = 'positive'")),
         Index('idx_microbiology_patient_date', 'patient_id', 'collection_date', 'infection'),
+    )
+
+class IngestMeta(Base):
+    """Single-row ingest metadata; data_version is bumped by every CSV upload."""
+    __tablename__ = "ingest_meta"
+    
+    id = Column(Integer, primary_key=True, default=1)
+    data_version = Column(Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        CheckConstraint('id = 1', name='chk_ingest_meta_single_row'),
     )
\ No newline at end of file
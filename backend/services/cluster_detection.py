@@ -1,56 +1,157 @@
+import numpy as np
 import pandas as pd
+from numba import njit
 from datetime import timedelta, datetime
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, func
-from models import Transfer, Microbiology
-from typing import List, Dict, Any
+from sqlalchemy import DDL, and_, or_, func, insert, select, text
+from sqlalchemy.schema import CreateIndex, ExecutableDDLElement
+from models import Transfer, Microbiology, IngestMeta, TRANSFER_STAY_INDEX_DDL, TRANSFER_STAY_INDEX_NAME
+from typing import List, Dict, Any, BinaryIO, Tuple, Union
 import io
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
-def parse_and_store_csv(db: Session, transfers_content: bytes, microbiology_content: bytes) -> Dict[str, Any]:
+# NOTE: Rows per chunk when streaming uploads; bounds peak memory regardless of file size
+CSV_CHUNK_SIZE = 50_000
+
+# NOTE: Rows fetched per round-trip when streaming query results into DataFrames
+DB_FETCH_SIZE = 50_000
+
+# NOTE: Positive tests needed before in-memory detection uses worker processes; smaller inputs use threads to skip pickling
+PROCESS_POOL_MIN_TESTS = 20_000
+
+NS_PER_DAY = 86_400_000_000_000
+
+# NOTE: Detected clusters keyed by (data_version, time_window, location_overlap); only the current version is kept
+_CLUSTER_CACHE: Dict[tuple, Dict[str, Any]] = {}
+
+def _as_csv_source(content: Union[bytes, BinaryIO]) -> BinaryIO:
+    """Wrap raw bytes for pandas; file objects are streamed as-is."""
+    return io.BytesIO(content) if isinstance(content, bytes) else content
+
+def _bulk_copy(db: Session, model, df: pd.DataFrame, columns: List[str]) -> int:
+    """
+    Bulk load DataFrame rows with COPY FROM STDIN on PostgreSQL (psycopg2),
+    falling back to a single Core executemany INSERT on other backends.
+    Returns number of rows loaded.
+    """
+    # COPY bypasses ORM defaults, so stamp created_at explicitly
+    rows = df[columns].assign(created_at=datetime.utcnow())
+    connection = db.connection()
+    
+    if connection.dialect.name == 'postgresql' and connection.dialect.driver == 'psycopg2':
+        buffer = io.StringIO()
+        rows.to_csv(buffer, index=False, header=False)
+        buffer.seek(0)
+        
+        # Raw cursor shares the session's connection, so COPY joins the same transaction
+        with connection.connection.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY {model.__tablename__} ({', '.join(rows.columns)}) FROM STDIN WITH CSV",
+                buffer
+            )
+    else:
+        # Core executemany skips the ORM unit of work; the dialect batches it into multi-row VALUES
+        connection.execute(insert(model), rows.to_dict(orient='records'))
+    
+    return len(rows)
+
+def _disable_synchronous_commit(db: Session) -> None:
+    """
+    Skip waiting for the WAL flush on commit for the current ingest transaction only (PostgreSQL).
+    NOTE: A crash can lose the last commit, but the ingest can be replayed from the source CSVs
+    """
+    if db.connection().dialect.name == 'postgresql':
+        db.execute(text("SET LOCAL synchronous_commit = off"))
+
+def _clear_tables(db: Session) -> None:
+    """
+    Empty transfers and microbiology ahead of a re-ingest.
+    NOTE: On PostgreSQL this is a catalog-level TRUNCATE (no per-row WAL, no dead tuples to vacuum)
+    """
+    if db.connection().dialect.name == 'postgresql':
+        db.execute(text(f"TRUNCATE TABLE {Transfer.__tablename__}, {Microbiology.__tablename__} RESTART IDENTITY"))
+    else:
+        db.query(Transfer).delete()
+        db.query(Microbiology).delete()
+
+def _drop_secondary_indexes(db: Session) -> List[ExecutableDDLElement]:
+    """
+    Drop the secondary indexes of transfers and microbiology on PostgreSQL, including the (location, stay) GiST index.
+    Returns the DDL that re-creates the dropped indexes once the bulk load is done (none on other backends).
+    """
+    connection = db.connection()
+    if connection.dialect.name != 'postgresql':
+        return []
+    
+    # Primary keys stay in place to reject duplicate ids during the load
+    indexes = [*Transfer.__table__.indexes, *Microbiology.__table__.indexes]
+    for index in indexes:
+        index.drop(connection, checkfirst=True)
+    rebuilds = [CreateIndex(index) for index in indexes]
+    
+    # The GiST index lives outside the models; only rebuild it where create_tables managed to add it
+    if connection.execute(text("SELECT to_regclass(:name)"), {"name": TRANSFER_STAY_INDEX_NAME}).scalar() is not None:
+        connection.execute(text(f"DROP INDEX {TRANSFER_STAY_INDEX_NAME}"))
+        rebuilds.append(DDL(TRANSFER_STAY_INDEX_DDL))
+    return rebuilds
+
+def _bump_data_version(db: Session) -> None:
+    """Increment the stored data version, creating the metadata row on first ingest."""
+    updated = db.query(IngestMeta).filter(IngestMeta.id == 1).update(
+        {IngestMeta.data_version: IngestMeta.data_version + 1}
+    )
+    if not updated:
+        db.add(IngestMeta(id=1, data_version=1))
+
+def _get_data_version(db: Session) -> int:
+    """Current data version (0 before the first upload)."""
+    return db.query(IngestMeta.data_version).filter(IngestMeta.id == 1).scalar() or 0
+
+def parse_and_store_csv(
+    db: Session,
+    transfers_content: Union[bytes, BinaryIO],
+    microbiology_content: Union[bytes, BinaryIO]
+) -> Dict[str, Any]:
     """
     Parse CSV files and store data in PostgreSQL database.
-    NOTE: Replaces direct CSV processing with database persistence for medical data integrity
+    Accepts raw bytes or binary file objects (e.g. spooled uploads).
+    NOTE: Blocking; call from a worker thread when serving async requests
     """
     try:
-        # Parse CSV content using pandas
-        transfers_df = pd.read_csv(io.BytesIO(transfers_content))
-        microbiology_df = pd.read_csv(io.BytesIO(microbiology_content))
-        
-        # Convert date columns to datetime objects
-        transfers_df['ward_in_time'] = pd.to_datetime(transfers_df['ward_in_time'])
-        transfers_df['ward_out_time'] = pd.to_datetime(transfers_df['ward_out_time'])
-        microbiology_df['collection_date'] = pd.to_datetime(microbiology_df['collection_date'])
+        _disable_synchronous_commit(db)
         
         # Clear existing data (for development - in production, consider upsert logic)
-        # FIXME - Could open up a MITM attack (High I/O overhead)
-        db.query(Transfer).delete()
-        db.query(Microbiology).delete()
+        _clear_tables(db)
         
-        # Store transfers data
-        transfers_count = 0
-        for _, row in transfers_df.iterrows():
-            transfer = Transfer(
-                transfer_id=str(row['transfer_id']),
-                patient_id=str(row['patient_id']),
-                ward_in_time=row['ward_in_time'].to_pydatetime(),
-                ward_out_time=row['ward_out_time'].to_pydatetime(),
-                location=str(row['location'])
-            )
-            db.add(transfer)
-            transfers_count += 1
+        # Drop secondary indexes so COPY skips per-row index maintenance; each is rebuilt in one sorted pass below
+        rebuilt_indexes = _drop_secondary_indexes(db)
         
-        # Store microbiology data
-        microbiology_count = 0
-        for _, row in microbiology_df.iterrows():
-            microbiology = Microbiology(
-                test_id=str(row['test_id']),
-                patient_id=str(row['patient_id']),
-                collection_date=row['collection_date'].to_pydatetime(),
-                infection=str(row['infection']),
-                result=str(row['result'])
+        # Stream each CSV in chunks straight into COPY; dates and string columns are typed inline by the C parser
+        transfers_count = sum(
+            _bulk_copy(db, Transfer, chunk, ['transfer_id', 'patient_id', 'ward_in_time', 'ward_out_time', 'location'])
+            for chunk in pd.read_csv(
+                _as_csv_source(transfers_content),
+                chunksize=CSV_CHUNK_SIZE,
+                parse_dates=['ward_in_time', 'ward_out_time'],
+                dtype={'transfer_id': 'string', 'patient_id': 'string', 'location': 'string'}
             )
-            db.add(microbiology)
-            microbiology_count += 1
+        )
+        microbiology_count = sum(
+            _bulk_copy(db, Microbiology, chunk, ['test_id', 'patient_id', 'collection_date', 'infection', 'result'])
+            for chunk in pd.read_csv(
+                _as_csv_source(microbiology_content),
+                chunksize=CSV_CHUNK_SIZE,
+                parse_dates=['collection_date'],
+                dtype={'test_id': 'string', 'patient_id': 'string', 'infection': 'string', 'result': 'string'}
+            )
+        )
+        
+        for statement in rebuilt_indexes:
+            db.connection().execute(statement)
+        
+        # Invalidate cached clusters in every worker, atomically with the new data
+        _bump_data_version(db)
         
         db.commit()
         
@@ -70,114 +171,321 @@ def find_clusters_from_db(db: Session, time_window: int = 14, location_overlap:
     NOTE: Database-optimized cluster detection with temporal and spatial analysis
     """
     try:
-        # Get all positive microbiology tests
-        positive_tests = db.query(Microbiology).filter(Microbiology.result == 'positive').all()
-
-        # Group positive tests by infection type
-        tests_by_infection = {}
-        for test in positive_tests:
-            if test.infection not in tests_by_infection:
-                tests_by_infection[test.infection] = []
-            tests_by_infection[test.infection].append(test)
-
-        # Pre-fetch all transfers for patients with positive tests for efficiency
-        positive_patient_ids = [pt.patient_id for pt in positive_tests]
-        all_transfers = db.query(Transfer).filter(Transfer.patient_id.in_(positive_patient_ids)).all()
-
-        patient_transfers = {}
-        for t in all_transfers:
-            if t.patient_id not in patient_transfers:
-                patient_transfers[t.patient_id] = []
-            patient_transfers[t.patient_id].append(t)
-
-        clusters = {}
-
-        for infection, tests in tests_by_infection.items():
-            if infection not in clusters:
-                clusters[infection] = []
-
-            patient_pairs = set()
-
-            for i in range(len(tests)):
-                for j in range(i + 1, len(tests)):
-                    test1 = tests[i]
-                    test2 = tests[j]
-
-                    if test1.patient_id == test2.patient_id:
-                        continue
-
-                    # Ensure consistent pair ordering to avoid duplicates
-                    pair = tuple(sorted((test1.patient_id, test2.patient_id)))
-                    if pair in patient_pairs:
-                        continue
-
-                    p1_transfers = patient_transfers.get(test1.patient_id, [])
-                    p2_transfers = patient_transfers.get(test2.patient_id, [])
-
-                    if _check_temporal_spatial_link(test1, test2, p1_transfers, p2_transfers, time_window, location_overlap):
-                        patient_pairs.add(pair)
-
-                        # Add to existing cluster or create a new one
-                        found_cluster = False
-                        for cluster_info in clusters[infection]:
-                            if test1.patient_id in cluster_info['patients'] or test2.patient_id in cluster_info['patients']:
-                                cluster_info['patients'].update([test1.patient_id, test2.patient_id])
-                                found_cluster = True
-                                break
-
-                        if not found_cluster:
-                            clusters[infection].append({
-                                'patients': {test1.patient_id, test2.patient_id},
-                                'start_date': min(test1.collection_date, test2.collection_date).date().isoformat(),
-                                'end_date': max(test1.collection_date, test2.collection_date).date().isoformat()
-                            })
-
-        # Convert sets to lists for JSON serialization
-        for infection in clusters:
-            for cluster_info in clusters[infection]:
-                cluster_info['patients'] = sorted(list(cluster_info['patients']))
+        connection = db.connection()
+        positive_tests = db.query(Microbiology).filter(Microbiology.result == 'positive')
+
+        if connection.dialect.name == 'postgresql':
+            # Link discovery runs entirely in the database
+            links = _find_linked_pairs_sql(connection, time_window, location_overlap)
+            infections = [infection for (infection,) in positive_tests.with_entities(Microbiology.infection).distinct()]
+        else:
+            # Load positive tests and the transfers of those patients as DataFrames, skipping ORM objects
+            tests = _read_frame(
+                connection,
+                select(Microbiology.patient_id, Microbiology.infection, Microbiology.collection_date)
+                .where(Microbiology.result == 'positive')
+            )
+
+            if tests.empty:
+                return {}
+
+            transfers = _read_frame(
+                connection,
+                select(Transfer.patient_id, Transfer.location, Transfer.ward_in_time, Transfer.ward_out_time)
+                .where(Transfer.patient_id.in_(select(Microbiology.patient_id).where(Microbiology.result == 'positive')))
+            )
+
+            # Infections are independent: detect each in its own worker with only its patients' transfers
+            work = [
+                (infection, infection_tests, transfers[transfers['patient_id'].isin(infection_tests['patient_id'])])
+                for infection, infection_tests in tests.groupby('infection', sort=False)
+            ]
+            executor_class = ProcessPoolExecutor if len(tests) >= PROCESS_POOL_MIN_TESTS else ThreadPoolExecutor
+            with executor_class(max_workers=min(len(work), os.cpu_count() or 1)) as executor:
+                futures = {
+                    infection: executor.submit(_detect_one_infection, infection, infection_tests, infection_transfers, time_window, location_overlap)
+                    for infection, infection_tests, infection_transfers in work
+                }
+                return {infection: future.result() for infection, future in futures.items()}
+
+        clusters = _assemble_clusters(links, infections)
 
         return clusters
     except Exception as e:
         raise Exception(f"Error detecting clusters: {str(e)}")
 
-def _check_temporal_spatial_link(test1, test2, p1_transfers, p2_transfers, time_window, location_overlap):
-    """Check for a temporal and spatial link between two patients."""
+def _detect_one_infection(infection: str, tests: pd.DataFrame, transfers: pd.DataFrame, time_window: int, location_overlap: bool) -> List[Dict[str, Any]]:
+    """
+    Detect the clusters of a single infection from its positive tests and those patients' transfers.
+    NOTE: Module-level so it can be pickled into worker processes
+    """
+    links = _find_linked_pairs_in_memory(tests, transfers, time_window, location_overlap)
+    return _assemble_clusters(links, [infection])[infection]
+
+def _read_frame(connection, statement) -> pd.DataFrame:
+    """
+    Read a projected query into a DataFrame.
+    NOTE: Streams through a server-side cursor where the driver supports one, in DB_FETCH_SIZE row chunks
+    """
+    chunks = pd.read_sql(
+        statement.execution_options(stream_results=True, yield_per=DB_FETCH_SIZE), connection, chunksize=DB_FETCH_SIZE
+    )
+    return pd.concat(chunks, ignore_index=True)
+
+def find_clusters_cached(db: Session, time_window: int = 14, location_overlap: bool = True) -> Dict[str, Any]:
+    """
+    Return detected clusters, recomputing only when a CSV upload has changed the data version.
+    NOTE: Callers must treat the returned clusters as read-only
+    """
+    key = (_get_data_version(db), time_window, location_overlap)
+    clusters = _CLUSTER_CACHE.get(key)
+    if clusters is None:
+        clusters = find_clusters_from_db(db, time_window, location_overlap)
+        
+        # Drop results for older data versions
+        for stale_key in [cached_key for cached_key in _CLUSTER_CACHE if cached_key[0] != key[0]]:
+            del _CLUSTER_CACHE[stale_key]
+        _CLUSTER_CACHE[key] = clusters
     
-    # Check time window between positive tests
-    time_diff = abs((test1.collection_date - test2.collection_date).days)
-    if time_diff > time_window:
-        return False
-
-    if not location_overlap:
-        return True
-
-    # Check for overlapping stays in the same location
-    for t1 in p1_transfers:
-        for t2 in p2_transfers:
-            if t1.location == t2.location:
-                overlap_start = max(t1.ward_in_time, t2.ward_in_time)
-                overlap_end = min(t1.ward_out_time, t2.ward_out_time)
-                if overlap_start <= overlap_end:
-                    return True
+    return clusters
+
+def _assemble_clusters(links: pd.DataFrame, infections) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Group linked patient pairs into clusters (connected components) per infection.
+    A cluster spans the earliest to the latest test date of its linked pairs.
+    """
+    clusters = {infection: [] for infection in infections}
+
+    for infection, pairs in links.groupby('infection', sort=False):
+        # Integer-code patients (sorted), then union every linked pair in a single pass
+        patients, codes = np.unique(pairs[['patient_id_a', 'patient_id_b']].to_numpy().ravel(), return_inverse=True)
+        codes = codes.reshape(-1, 2).astype(np.int64)
+        roots = _union_find_roots(len(patients), codes[:, 0], codes[:, 1])
+        
+        # Number clusters in order of their smallest patient
+        _, first_members, root_labels = np.unique(roots, return_index=True, return_inverse=True)
+        labels = np.argsort(np.argsort(first_members))[root_labels]
+
+        pair_labels = labels[codes[:, 0]]
+        start_dates = pairs['start_date'].groupby(pair_labels).min()
+        end_dates = pairs['end_date'].groupby(pair_labels).max()
+        members = pd.Series(patients).groupby(labels).agg(list)
+
+        for label, cluster_patients in members.items():
+            clusters[infection].append({
+                'patients': cluster_patients,
+                'start_date': start_dates[label].date().isoformat(),
+                'end_date': end_dates[label].date().isoformat()
+            })
+
+    return clusters
+
+@njit(cache=True, nogil=True)
+def _find_root(parent: np.ndarray, node: int) -> int:
+    """Root of node's set, halving the path on the way up."""
+    while parent[node] != node:
+        parent[node] = parent[parent[node]]
+        node = parent[node]
+    return node
+
+@njit(cache=True, nogil=True)
+def _union_find_roots(size: int, nodes_a: np.ndarray, nodes_b: np.ndarray) -> np.ndarray:
+    """
+    Union-Find (disjoint-set union by rank) over nodes 0..size-1 joined by the (nodes_a[k], nodes_b[k]) edges.
+    Returns the root of every node; nodes share a root exactly when they are connected.
+    """
+    parent = np.arange(size)
+    rank = np.zeros(size, dtype=np.int8)
+    for k in range(nodes_a.size):
+        root_a = _find_root(parent, nodes_a[k])
+        root_b = _find_root(parent, nodes_b[k])
+        if root_a == root_b:
+            continue
+        if rank[root_a] < rank[root_b]:
+            root_a, root_b = root_b, root_a
+        parent[root_b] = root_a
+        if rank[root_a] == rank[root_b]:
+            rank[root_a] += 1
     
+    for node in range(size):
+        parent[node] = _find_root(parent, node)
+    return parent
+
+# NOTE: Positive-test pairs per infection within the time window; one row per patient pair
+_LINKED_PAIRS_SQL = """
+    SELECT
+        m1.infection,
+        m1.patient_id AS patient_id_a,
+        m2.patient_id AS patient_id_b,
+        MIN(LEAST(m1.collection_date, m2.collection_date)) AS start_date,
+        MAX(GREATEST(m1.collection_date, m2.collection_date)) AS end_date
+    FROM microbiology m1
+    JOIN microbiology m2
+        ON m2.infection = m1.infection
+        AND m2.result = 'positive'
+        AND m1.patient_id < m2.patient_id
+        AND ABS(m1.collection_date::date - m2.collection_date::date) <= :time_window
+    WHERE m1.result = 'positive'
+    {location_filter}
+    GROUP BY m1.infection, m1.patient_id, m2.patient_id
+"""
+
+# NOTE: Overlapping stays in the same location; served by the (location, stay) GiST index
+_STAY_OVERLAP_FILTER = """
+    AND EXISTS (
+        SELECT 1
+        FROM transfers t1
+        JOIN transfers t2
+            ON t2.location = t1.location
+            AND t2.stay && t1.stay
+        WHERE t1.patient_id = m1.patient_id
+        AND t2.patient_id = m2.patient_id
+    )
+"""
+
+def _find_linked_pairs_sql(connection, time_window: int, location_overlap: bool) -> pd.DataFrame:
+    """
+    Find linked patient pairs with a single PostgreSQL query.
+    Returns one row per linked (infection, patient_id_a, patient_id_b) with the pair's date range.
+    """
+    query = _LINKED_PAIRS_SQL.format(location_filter=_STAY_OVERLAP_FILTER if location_overlap else "")
+    return pd.read_sql(text(query), connection, params={"time_window": time_window})
+
+def _find_linked_pairs_in_memory(tests: pd.DataFrame, transfers: pd.DataFrame, time_window: int, location_overlap: bool) -> pd.DataFrame:
+    """
+    Find temporally (and optionally spatially) linked patient pairs with vectorized NumPy passes.
+    Used when the database cannot evaluate the link query (non-PostgreSQL backends).
+    Returns one row per linked (infection, patient_id_a, patient_id_b) with the pair's date range.
+    """
+    # Integer patient index shared by tests and stays; follows sorted patient_id order
+    patient_ids, patient_index = np.unique(tests['patient_id'].to_numpy(dtype=object), return_inverse=True)
+    
+    # Temporal link: positive tests for the same infection within the time window
+    pairs = _find_tests_within_window(tests.assign(patient_index=patient_index), time_window)
+
+    if location_overlap:
+        # Spatial link: stays in the same location with overlapping intervals
+        stays = _index_patient_stays(transfers, patient_ids)
+        pairs = pairs[_have_overlapping_stays(stays, pairs['patient_a'].to_numpy(), pairs['patient_b'].to_numpy())]
+    
+    # Pack each ordered patient pair into one uint64 key (patient_a << 32 | patient_b), then dedupe with a single sort
+    keys = (pairs['patient_a'].to_numpy().astype(np.uint64) << np.uint64(32)) | pairs['patient_b'].to_numpy().astype(np.uint64)
+    infection_codes, infections = pd.factorize(pairs['infection'])
+    order = np.lexsort((keys, infection_codes))
+    keys, infection_codes = keys[order], infection_codes[order]
+    firsts = np.flatnonzero(np.r_[len(keys) > 0, (keys[1:] != keys[:-1]) | (infection_codes[1:] != infection_codes[:-1])])
+    
+    # Date range of each unique pair over all of its linked tests
+    dates_a = pairs['collection_date_a'].to_numpy(dtype='datetime64[ns]')[order]
+    dates_b = pairs['collection_date_b'].to_numpy(dtype='datetime64[ns]')[order]
+    return pd.DataFrame({
+        'infection': np.asarray(infections, dtype=object)[infection_codes[firsts]],
+        'patient_id_a': patient_ids[(keys[firsts] >> np.uint64(32)).astype(np.int64)],
+        'patient_id_b': patient_ids[(keys[firsts] & np.uint64(0xFFFFFFFF)).astype(np.int64)],
+        'start_date': np.minimum.reduceat(np.minimum(dates_a, dates_b), firsts),
+        'end_date': np.maximum.reduceat(np.maximum(dates_a, dates_b), firsts)
+    })
+
+def _find_tests_within_window(tests: pd.DataFrame, time_window: int) -> pd.DataFrame:
+    """
+    Pair positive tests of the same infection from different patients taken within time_window days.
+    Sweeps each infection's tests in date order, so only in-window candidate pairs are generated.
+    Returns (infection, patient_a, patient_b, collection_date_a, collection_date_b) rows of patient indexes with patient_a < patient_b.
+    """
+    tests = tests.sort_values(['infection', 'collection_date'], kind='stable')
+    infections = tests['infection'].to_numpy(dtype=object)
+    patients = tests['patient_index'].to_numpy()
+    # Calendar day number (days since epoch) per test, computed once; window checks are plain integer compares
+    days = (tests['collection_date'].to_numpy(dtype='datetime64[ns]').view(np.int64) // NS_PER_DAY).astype(np.int32)
+    
+    # Exclusive end of each test's window; the search never leaves the test's own infection block
+    window_ends = np.empty(len(tests), dtype=np.int64)
+    block_starts = np.flatnonzero(np.r_[True, infections[1:] != infections[:-1]])
+    for start, end in zip(block_starts, np.r_[block_starts[1:], len(tests)]):
+        block_days = days[start:end]
+        window_ends[start:end] = start + np.searchsorted(block_days, block_days + time_window, side='right')
+    
+    # Expand each test's [i + 1, window_end) range into explicit (left, right) index pairs
+    counts = window_ends - np.arange(len(tests)) - 1
+    left = np.repeat(np.arange(len(tests)), counts)
+    right = left + 1 + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    
+    # Drop same-patient pairs and orient each pair so patient_a < patient_b
+    distinct = patients[left] != patients[right]
+    left, right = left[distinct], right[distinct]
+    swap = patients[left] > patients[right]
+    left, right = np.where(swap, right, left), np.where(swap, left, right)
+    
+    return pd.DataFrame({
+        'infection': infections[left],
+        'patient_a': patients[left],
+        'patient_b': patients[right],
+        'collection_date_a': tests['collection_date'].to_numpy()[left],
+        'collection_date_b': tests['collection_date'].to_numpy()[right]
+    })
+
+def _index_patient_stays(transfers: pd.DataFrame, patient_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Lay out the stays of patient_ids as struct-of-arrays grouped by patient index (CSR style).
+    Returns (offsets, locations, starts, ends); stays of patient_ids[i] are rows offsets[i]:offsets[i + 1].
+    """
+    transfers = transfers[transfers['patient_id'].isin(patient_ids)]
+    stay_patients = np.searchsorted(patient_ids, transfers['patient_id'].to_numpy(dtype=object))
+    order = np.argsort(stay_patients, kind='stable')
+    
+    offsets = np.r_[0, np.cumsum(np.bincount(stay_patients, minlength=len(patient_ids)))]
+    locations = pd.Categorical(transfers['location']).codes.astype(np.int32)[order]
+    # Times as int64 nanoseconds
+    starts = transfers['ward_in_time'].to_numpy(dtype='datetime64[ns]').view(np.int64)[order]
+    ends = transfers['ward_out_time'].to_numpy(dtype='datetime64[ns]').view(np.int64)[order]
+    return offsets, locations, starts, ends
+
+@njit(cache=True, nogil=True)
+def _has_overlap(locations: np.ndarray, starts: np.ndarray, ends: np.ndarray, a_start: int, a_end: int, b_start: int, b_end: int) -> bool:
+    """Whether any stay in rows a_start:a_end overlaps a stay in rows b_start:b_end in the same location."""
+    for i in range(a_start, a_end):
+        for j in range(b_start, b_end):
+            if locations[i] == locations[j] and max(starts[i], starts[j]) <= min(ends[i], ends[j]):
+                return True
     return False
 
+@njit(cache=True, nogil=True)
+def _overlap_kernel(offsets: np.ndarray, locations: np.ndarray, starts: np.ndarray, ends: np.ndarray, patients_a: np.ndarray, patients_b: np.ndarray) -> np.ndarray:
+    """Apply _has_overlap to the CSR stay slices of each candidate pair."""
+    linked = np.zeros(patients_a.size, dtype=np.bool_)
+    for k in range(patients_a.size):
+        a, b = patients_a[k], patients_b[k]
+        linked[k] = _has_overlap(locations, starts, ends, offsets[a], offsets[a + 1], offsets[b], offsets[b + 1])
+    return linked
+
+def _have_overlapping_stays(stays: Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray], patients_a: np.ndarray, patients_b: np.ndarray) -> np.ndarray:
+    """
+    For each (patients_a[k], patients_b[k]) pair, whether the two patients had overlapping stays in the same location.
+    NOTE: Compiled kernel; stops at the first overlapping stay combination of each pair
+    """
+    offsets, locations, starts, ends = stays
+    # Fixed dtypes keep a single compiled specialization
+    return _overlap_kernel(
+        offsets.astype(np.int64), locations, starts, ends,
+        patients_a.astype(np.int64), patients_b.astype(np.int64)
+    )
+
 def get_cluster_statistics(db: Session) -> Dict[str, Any]:
     """
     Get statistics about the stored data and detected clusters.
     NOTE: Analytics endpoint for clinical dashboard
     """
     try:
-        total_transfers = db.query(Transfer).count()
-        total_tests = db.query(Microbiology).count()
-        positive_tests = db.query(Microbiology).filter(
-            Microbiology.result == 'positive'
-        ).count()
-        unique_patients = db.query(Transfer.patient_id).distinct().count()
-        unique_locations = db.query(Transfer.location).distinct().count()
+        # Fetch all counts in a single round-trip
+        total_transfers, total_tests, positive_tests, unique_patients, unique_locations = db.execute(select(
+            select(func.count()).select_from(Transfer).scalar_subquery(),
+            select(func.count()).select_from(Microbiology).scalar_subquery(),
+            select(func.count()).where(Microbiology.result == 'positive').scalar_subquery(),
+            select(func.count(Transfer.patient_id.distinct())).scalar_subquery(),
+            select(func.count(Transfer.location.distinct())).scalar_subquery()
+        )).one()
         
-        clusters = find_clusters_from_db(db)
+        clusters = find_clusters_cached(db)
         total_clusters = sum(len(infection_clusters) for infection_clusters in clusters.values())
         
         return {
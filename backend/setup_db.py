@@ -1,7 +1,6 @@
 # NOTE: Database initialization and table creation for medical data system
 from sqlalchemy import create_engine, text
-from models import Base
-from database import DATABASE_URL, engine
+from database import DATABASE_URL, engine, create_tables
 import os
 
 def setup_database() -> bool:
@@ -17,8 +16,8 @@ def setup_database() -> bool:
         
         print("Creating database tables...")
         
-        # Create all tables defined in models
-        Base.metadata.create_all(bind=engine)
+        # Create all tables defined in models and upgrade existing ones
+        create_tables()
         
         print("Database setup completed successfully")
         print("Available tables: transfers, microbiology")
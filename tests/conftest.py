@@ -0,0 +1,41 @@
+"""Shared pytest configuration: backend import paths and the optional PostgreSQL test database."""
+
+import os
+import sys
+import uuid
+
+import pytest
+from sqlalchemy import create_engine, make_url, text
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend")
+
+# NOTE: The app runs from backend/, and db_utils is a standalone module in backend/database/
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(1, os.path.join(BACKEND_DIR, "database"))
+
+@pytest.fixture
+def postgres_url():
+    """
+    PostgreSQL URL for tests that execute SQL, taken from TEST_DATABASE_URL.
+    NOTE: Tests using this fixture are skipped when no test database is configured
+    """
+    url = os.getenv("TEST_DATABASE_URL")
+    if not url:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    return make_url(url)
+
+@pytest.fixture
+def postgres_database(postgres_url):
+    """Throwaway database on the test server; yields its psycopg2 URL and drops it afterwards."""
+    name = f"test_{uuid.uuid4().hex[:12]}"
+    admin_engine = create_engine(postgres_url.set(drivername="postgresql+psycopg2"), isolation_level="AUTOCOMMIT")
+    with admin_engine.connect() as connection:
+        connection.execute(text(f"CREATE DATABASE {name}"))
+    
+    url = postgres_url.set(drivername="postgresql+psycopg2", database=name)
+    try:
+        yield url
+    finally:
+        with admin_engine.connect() as connection:
+            connection.execute(text(f"DROP DATABASE {name} WITH (FORCE)"))
+        admin_engine.dispose()
@@ -0,0 +1,292 @@
+"""Tests for the cluster detection paths in backend/services/cluster_detection.py."""
+
+import io
+import random
+from datetime import datetime, timedelta
+from itertools import combinations
+
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from database import create_tables
+from models import Base, TRANSFER_STAY_COLUMN_DDL
+from services import cluster_detection
+from services.cluster_detection import (
+    _assemble_clusters, _detect_one_infection, _find_linked_pairs_sql, _get_data_version,
+    find_clusters_cached, find_clusters_from_db, parse_and_store_csv
+)
+
+BASE = datetime(2024, 1, 1)
+
+def _random_data(seed: int, patients: int = 40, stays: int = 120, tests: int = 90):
+    """Random positive tests (with times of day) and ward stays, including zero-length and touching stays."""
+    rng = random.Random(seed)
+    transfers = []
+    for _ in range(stays):
+        ward_in = BASE + timedelta(days=rng.randint(0, 60), hours=rng.choice([0, 8, 16]))
+        transfers.append((f"P{rng.randint(0, patients)}", rng.choice(['ICU', 'A', 'B', 'C']), ward_in, ward_in + timedelta(days=rng.randint(0, 8))))
+    positives = [
+        (f"P{rng.randint(0, patients)}", rng.choice(['CRE', 'MRSA']), BASE + timedelta(days=rng.randint(0, 60), hours=rng.randint(0, 23)))
+        for _ in range(tests)
+    ]
+    return (
+        pd.DataFrame(positives, columns=['patient_id', 'infection', 'collection_date']),
+        pd.DataFrame(transfers, columns=['patient_id', 'location', 'ward_in_time', 'ward_out_time'])
+    )
+
+def _reference_clusters(tests: pd.DataFrame, transfers: pd.DataFrame, infection: str, time_window: int, location_overlap: bool):
+    """Brute-force clusters: every test pair, every stay pair, then naive component merging."""
+    stays = list(transfers.itertuples(index=False))
+    tests = [test for test in tests.itertuples(index=False) if test.infection == infection]
+
+    edges = {}
+    for a, b in combinations(tests, 2):
+        if a.patient_id == b.patient_id or abs((a.collection_date.date() - b.collection_date.date()).days) > time_window:
+            continue
+        if location_overlap and not any(
+            s1.location == s2.location and max(s1.ward_in_time, s2.ward_in_time) <= min(s1.ward_out_time, s2.ward_out_time)
+            for s1 in stays if s1.patient_id == a.patient_id
+            for s2 in stays if s2.patient_id == b.patient_id
+        ):
+            continue
+        pair = tuple(sorted((a.patient_id, b.patient_id)))
+        dates = (min(a.collection_date, b.collection_date), max(a.collection_date, b.collection_date))
+        start, end = edges.get(pair, dates)
+        edges[pair] = (min(start, dates[0]), max(end, dates[1]))
+
+    components = []
+    for pair, (start, end) in edges.items():
+        touching = [component for component in components if component['patients'] & set(pair)]
+        merged = {'patients': set(pair), 'start': start, 'end': end}
+        for component in touching:
+            components.remove(component)
+            merged = {
+                'patients': merged['patients'] | component['patients'],
+                'start': min(merged['start'], component['start']),
+                'end': max(merged['end'], component['end'])
+            }
+        components.append(merged)
+
+    return sorted(
+        (sorted(component['patients']), component['start'].date().isoformat(), component['end'].date().isoformat())
+        for component in components
+    )
+
+def _as_csv_uploads(tests: pd.DataFrame, transfers: pd.DataFrame):
+    """Render _random_data frames as the two upload CSVs, with ids and a negative test per patient."""
+    transfers_csv = transfers.assign(transfer_id=[f"T{n}" for n in range(len(transfers))])
+    microbiology = pd.concat([
+        tests.assign(result='positive'),
+        tests.drop_duplicates('patient_id').assign(infection='CRE', result='negative')
+    ], ignore_index=True)
+    microbiology = microbiology.assign(test_id=[f"M{n}" for n in range(len(microbiology))])
+    return transfers_csv.to_csv(index=False).encode(), microbiology.to_csv(index=False).encode()
+
+def _normalise(clusters):
+    return sorted((sorted(cluster['patients']), cluster['start_date'], cluster['end_date']) for cluster in clusters)
+
+@pytest.mark.parametrize("seed", range(25))
+@pytest.mark.parametrize("time_window, location_overlap", [(14, True), (3, True), (0, True), (14, False)])
+def test_in_memory_detection_matches_brute_force(seed, time_window, location_overlap):
+    tests, transfers = _random_data(seed)
+
+    for infection, infection_tests in tests.groupby('infection'):
+        clusters = _detect_one_infection(infection, infection_tests, transfers, time_window, location_overlap)
+        assert _normalise(clusters) == _reference_clusters(tests, transfers, infection, time_window, location_overlap)
+
+def test_assemble_clusters_merges_bridged_pairs():
+    links = pd.DataFrame({
+        'infection': ['CRE', 'CRE', 'CRE', 'MRSA'],
+        'patient_id_a': ['P1', 'P3', 'P2', 'P7'],
+        'patient_id_b': ['P2', 'P4', 'P3', 'P8'],
+        'start_date': pd.to_datetime(['2024-01-05', '2024-01-01', '2024-01-03', '2024-02-01']),
+        'end_date': pd.to_datetime(['2024-01-06', '2024-01-02', '2024-01-09', '2024-02-02'])
+    })
+
+    # P2-P3 bridges {P1, P2} and {P3, P4} into one cluster
+    assert _assemble_clusters(links, ['CRE', 'MRSA', 'CDI']) == {
+        'CRE': [{'patients': ['P1', 'P2', 'P3', 'P4'], 'start_date': '2024-01-01', 'end_date': '2024-01-09'}],
+        'MRSA': [{'patients': ['P7', 'P8'], 'start_date': '2024-02-01', 'end_date': '2024-02-02'}],
+        'CDI': []
+    }
+
+@pytest.mark.parametrize("seed", range(3))
+def test_upload_then_detect_on_sqlite(seed):
+    tests, transfers = _random_data(seed)
+    engine = create_engine("sqlite://")
+    create_tables(engine)
+    
+    with Session(engine) as db:
+        result = parse_and_store_csv(db, *_as_csv_uploads(tests, transfers))
+        clusters = find_clusters_from_db(db)
+    
+    assert result["transfers_imported"] == len(transfers)
+    assert result["microbiology_imported"] == len(tests) + tests['patient_id'].nunique()
+    assert {infection: _normalise(found) for infection, found in clusters.items()} == {
+        infection: _reference_clusters(tests, transfers, infection, 14, True) for infection in tests['infection'].unique()
+    }
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("time_window, location_overlap", [(14, True), (3, True), (14, False)])
+def test_sql_detection_matches_in_memory(postgres_database, seed, time_window, location_overlap):
+    tests, transfers = _random_data(seed)
+    engine = create_engine(postgres_database)
+    try:
+        with engine.begin() as connection:
+            # Only the columns the link query reads; the (location, stay) GiST index is a performance aid
+            connection.execute(text("""
+                CREATE TABLE transfers (
+                    patient_id VARCHAR(50), location VARCHAR(100), ward_in_time TIMESTAMP, ward_out_time TIMESTAMP,
+                    stay TSRANGE GENERATED ALWAYS AS (tsrange(ward_in_time, ward_out_time, '[]')) STORED
+                );
+                CREATE TABLE microbiology (patient_id VARCHAR(50), infection VARCHAR(100), collection_date TIMESTAMP, result VARCHAR(20))
+            """))
+            transfers.to_sql('transfers', connection, if_exists='append', index=False)
+            tests.assign(result='positive').to_sql('microbiology', connection, if_exists='append', index=False)
+
+            links = _find_linked_pairs_sql(connection, time_window, location_overlap)
+
+        sql_clusters = _assemble_clusters(links, tests['infection'].unique())
+        for infection, infection_tests in tests.groupby('infection'):
+            in_memory = _detect_one_infection(infection, infection_tests, transfers, time_window, location_overlap)
+            assert _normalise(sql_clusters[infection]) == _normalise(in_memory)
+    finally:
+        engine.dispose()
+
+# Numeric-looking locations must survive ingest as strings
+UPLOAD_TRANSFERS = (
+    "transfer_id,patient_id,ward_in_time,ward_out_time,location\n"
+    "T1,P1,2024-01-01,2024-01-05,0101\n"
+    "T2,P2,2024-01-02,2024-01-06,0101\n"
+    "T3,P3,2024-01-03,2024-01-04,0202\n"
+    "T4,P1,2024-01-06,2024-01-09,0202\n"
+    "T5,P4,2024-01-07,2024-01-08,0202\n"
+).encode()
+UPLOAD_MICROBIOLOGY = (
+    "test_id,patient_id,collection_date,infection,result\n"
+    "M1,P1,2024-01-03,CRE,positive\n"
+    "M2,P2,2024-01-04,CRE,positive\n"
+    "M3,P3,2024-01-03,CRE,negative\n"
+).encode()
+
+def _spy_bulk_copy(monkeypatch, on_chunk=None):
+    """Record (table, rows, dtypes) of every chunk handed to _bulk_copy."""
+    calls = []
+    original = cluster_detection._bulk_copy
+    
+    def spy(db, model, df, columns):
+        calls.append((model.__tablename__, len(df), {column: str(df[column].dtype) for column in columns}))
+        if on_chunk:
+            on_chunk(db)
+        return original(db, model, df, columns)
+    
+    monkeypatch.setattr(cluster_detection, "_bulk_copy", spy)
+    return calls
+
+def test_parse_and_store_csv_streams_typed_chunks_on_sqlite(monkeypatch):
+    monkeypatch.setattr(cluster_detection, "CSV_CHUNK_SIZE", 2)
+    calls = _spy_bulk_copy(monkeypatch)
+    engine = create_engine("sqlite://")
+    create_tables(engine)
+    
+    with Session(engine) as db:
+        result = parse_and_store_csv(db, io.BytesIO(UPLOAD_TRANSFERS), io.BytesIO(UPLOAD_MICROBIOLOGY))
+        locations = db.execute(text("SELECT location FROM transfers ORDER BY transfer_id")).scalars().all()
+    
+    assert result == {"transfers_imported": 5, "microbiology_imported": 3, "status": "success"}
+    assert [(table, rows) for table, rows, _ in calls] == [
+        ("transfers", 2), ("transfers", 2), ("transfers", 1), ("microbiology", 2), ("microbiology", 1)
+    ]
+    # Datetime resolution (ns/us) depends on the pandas version
+    assert {column: dtype[:10] for column, dtype in calls[0][2].items()} == {
+        "transfer_id": "string", "patient_id": "string", "ward_in_time": "datetime64",
+        "ward_out_time": "datetime64", "location": "string"
+    }
+    assert calls[-1][2]["collection_date"].startswith("datetime64")
+    assert locations == ["0101", "0101", "0202", "0202", "0202"]
+
+def test_parse_and_store_csv_replaces_previous_upload_on_sqlite():
+    engine = create_engine("sqlite://")
+    create_tables(engine)
+    
+    with Session(engine) as db:
+        parse_and_store_csv(db, UPLOAD_TRANSFERS, UPLOAD_MICROBIOLOGY)
+        # Same ids again: the old rows must be deleted first or the primary keys would collide
+        result = parse_and_store_csv(db, UPLOAD_TRANSFERS.rsplit(b"T5", 1)[0], UPLOAD_MICROBIOLOGY)
+        
+        assert result["transfers_imported"] == 4
+        assert db.execute(text("SELECT COUNT(*) FROM transfers")).scalar() == 4
+        assert db.execute(text("SELECT COUNT(*) FROM microbiology")).scalar() == 3
+        assert _get_data_version(db) == 2
+
+def test_parse_and_store_csv_copies_and_rebuilds_indexes_on_postgres(postgres_database, monkeypatch):
+    engine = create_engine(postgres_database)
+    try:
+        try:
+            create_tables(engine)
+        except Exception:
+            # Without btree_gist only the GiST index is missing; ingest rebuilds whatever exists
+            with engine.begin() as connection:
+                Base.metadata.create_all(connection)
+                connection.execute(text(TRANSFER_STAY_COLUMN_DDL))
+        
+        index_query = text(
+            "SELECT indexname FROM pg_indexes WHERE tablename IN ('transfers', 'microbiology') ORDER BY indexname"
+        )
+        with engine.connect() as connection:
+            indexes_before = connection.execute(index_query).scalars().all()
+        
+        # COPY must carry the load; the executemany fallback would hide a broken COPY path
+        monkeypatch.setattr(cluster_detection, "insert", None)
+        indexes_during_load = []
+        _spy_bulk_copy(monkeypatch, lambda db: indexes_during_load.append(db.execute(index_query).scalars().all()))
+        
+        with Session(engine) as db:
+            parse_and_store_csv(db, UPLOAD_TRANSFERS, UPLOAD_MICROBIOLOGY)
+            result = parse_and_store_csv(db, UPLOAD_TRANSFERS, UPLOAD_MICROBIOLOGY)
+            
+            assert result == {"transfers_imported": 5, "microbiology_imported": 3, "status": "success"}
+            assert db.execute(text("SELECT COUNT(*) FROM transfers")).scalar() == 5
+            assert db.execute(text("SELECT COUNT(*) FROM microbiology")).scalar() == 3
+            assert db.execute(text("SELECT stay::text FROM transfers WHERE transfer_id = 'T1'")).scalar() == \
+                '["2024-01-01 00:00:00","2024-01-05 00:00:00"]'
+            
+            indexes_after = db.execute(index_query).scalars().all()
+        
+        assert indexes_during_load[0] == ["microbiology_pkey", "transfers_pkey"]
+        assert indexes_after == indexes_before
+    finally:
+        engine.dispose()
+
+def test_find_clusters_cached_recomputes_only_after_an_upload(monkeypatch):
+    monkeypatch.setattr(cluster_detection, "_CLUSTER_CACHE", {})
+    detections = []
+    original = cluster_detection.find_clusters_from_db
+    
+    def counting_find_clusters(db, time_window=14, location_overlap=True):
+        detections.append((time_window, location_overlap))
+        return original(db, time_window, location_overlap)
+    
+    monkeypatch.setattr(cluster_detection, "find_clusters_from_db", counting_find_clusters)
+    engine = create_engine("sqlite://")
+    create_tables(engine)
+    
+    with Session(engine) as db:
+        parse_and_store_csv(db, UPLOAD_TRANSFERS, UPLOAD_MICROBIOLOGY)
+        first = find_clusters_cached(db)
+        
+        assert find_clusters_cached(db) is first
+        assert detections == [(14, True)]
+        
+        find_clusters_cached(db, time_window=3)
+        assert set(cluster_detection._CLUSTER_CACHE) == {(1, 14, True), (1, 3, True)}
+        
+        # An upload bumps the data version: the next call recomputes and evicts version 1 entries
+        parse_and_store_csv(db, UPLOAD_TRANSFERS, UPLOAD_MICROBIOLOGY)
+        second = find_clusters_cached(db)
+    
+    assert second is not first and second == first
+    assert detections == [(14, True), (3, True), (14, True)]
+    assert set(cluster_detection._CLUSTER_CACHE) == {(2, 14, True)}
@@ -0,0 +1,72 @@
+"""Tests for engine configuration and schema setup in backend/database.py."""
+
+import importlib
+
+import pytest
+from sqlalchemy import create_engine, text
+
+import database
+
+@pytest.fixture
+def reload_database(monkeypatch):
+    """Re-import database.py with DATABASE_URL set, restoring the default module afterwards."""
+    def _reload(url: str):
+        monkeypatch.setenv("DATABASE_URL", url)
+        return importlib.reload(database)
+    
+    yield _reload
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+    importlib.reload(database)
+
+@pytest.mark.parametrize("url, sync_driver", [
+    ("postgresql://user:pw@db:5432/clusters", "postgresql+psycopg2"),
+    ("postgresql+psycopg2://user:pw@db:5432/clusters", "postgresql+psycopg2"),
+])
+def test_engine_urls_pick_drivers(reload_database, url, sync_driver):
+    module = reload_database(url)
+    
+    assert module.engine.url.drivername == sync_driver
+    assert module.async_engine.url.drivername == "postgresql+asyncpg"
+    assert module.async_engine.url.database == "clusters"
+    assert module.async_engine.url.password == "pw"
+
+def test_create_tables_upgrades_existing_transfers_table(postgres_database):
+    engine = create_engine(postgres_database)
+    try:
+        with engine.begin() as connection:
+            available = connection.execute(text(
+                "SELECT EXISTS (SELECT FROM pg_available_extensions WHERE name = 'btree_gist')"
+            )).scalar()
+            if not available:
+                pytest.skip("btree_gist extension is not available on the test server")
+            
+            # Table as created before the stay column and its GiST index were added
+            connection.execute(text("""
+                CREATE TABLE transfers (
+                    transfer_id VARCHAR(50) PRIMARY KEY,
+                    patient_id VARCHAR(50) NOT NULL,
+                    ward_in_time TIMESTAMP NOT NULL,
+                    ward_out_time TIMESTAMP NOT NULL,
+                    location VARCHAR(100) NOT NULL,
+                    created_at TIMESTAMP
+                )
+            """))
+            connection.execute(text(
+                "INSERT INTO transfers VALUES ('T1', 'P1', '2024-01-01', '2024-01-05', 'ICU', NULL)"
+            ))
+        
+        # Idempotent: a second run on the upgraded schema is a no-op
+        database.create_tables(bind=engine)
+        database.create_tables(bind=engine)
+        
+        with engine.connect() as connection:
+            assert connection.execute(text("SELECT stay::text FROM transfers")).scalar() == \
+                '["2024-01-01 00:00:00","2024-01-05 00:00:00"]'
+            assert connection.execute(text(
+                "SELECT EXISTS (SELECT FROM pg_indexes WHERE indexname = 'idx_transfers_location_stay')"
+            )).scalar()
+            assert connection.execute(text(
+                "SELECT EXISTS (SELECT FROM information_schema.tables WHERE table_name = 'ingest_meta')"
+            )).scalar()
+    finally:
+        engine.dispose()
@@ -0,0 +1,175 @@
+"""Tests for the asyncpg CSV loading helpers in backend/database/db_utils.py."""
+
+import asyncio
+import random
+import uuid
+from decimal import Decimal
+from datetime import date, timedelta
+
+import asyncpg
+import pytest
+
+from db_utils import ClusterQueryBuilder, CSVDataLoader, DatabaseManager, _iter_csv, _parse_date, _parse_non_iso_date
+
+TRANSFER_COLS = ['transfer_id', 'patient_id', 'ward_in_time', 'ward_out_time', 'location']
+
+def _write(tmp_path, content: str, encoding: str = 'utf-8') -> str:
+    path = tmp_path / "transfers.csv"
+    path.write_text(content, encoding=encoding)
+    return str(path)
+
+def test_iter_csv_skips_blank_lines(tmp_path):
+    path = _write(tmp_path, (
+        "transfer_id,patient_id,ward_in_time,ward_out_time,location\n"
+        "T1,P1,2024-01-01,2024-01-05,ICU\n"
+        "\n"
+        "T2,P2,2024-01-02,2024-01-06,ICU\n"
+        "\n"
+    ))
+    
+    assert [row[0] for row in _iter_csv(path, TRANSFER_COLS)] == ['T1', 'T2']
+
+def test_iter_csv_reads_utf8_bom_header(tmp_path):
+    path = _write(tmp_path, (
+        "transfer_id,patient_id,ward_in_time,ward_out_time,location\n"
+        "T1,P1,2024-01-01,2024-01-05,ICU\n"
+    ), encoding='utf-8-sig')
+    
+    assert list(_iter_csv(path, TRANSFER_COLS)) == [('T1', 'P1', '2024-01-01', '2024-01-05', 'ICU')]
+
+def test_iter_csv_selects_and_strips_required_columns(tmp_path):
+    path = _write(tmp_path, (
+        "location,extra,transfer_id,patient_id,ward_in_time,ward_out_time\n"
+        " ICU ,x, T1 ,P1,2024-01-01\n"
+    ))
+    
+    assert list(_iter_csv(path, TRANSFER_COLS)) == [('T1', 'P1', '2024-01-01', '', 'ICU')]
+
+def test_iter_csv_rejects_missing_columns(tmp_path):
+    path = _write(tmp_path, "transfer_id,patient_id\nT1,P1\n")
+    
+    with pytest.raises(ValueError, match="Missing required columns"):
+        list(_iter_csv(path, TRANSFER_COLS))
+
+@pytest.mark.parametrize("value, expected", [
+    ("2024-01-02", date(2024, 1, 2)),
+    ("2024-01-02 10:30:00", date(2024, 1, 2)),
+    ("01/02/2024", date(2024, 1, 2)),
+    ("2 Jan 2024", date(2024, 1, 2)),
+    ("", None),
+    ("not a date", None),
+    ("2024-13-01", None),
+])
+def test_parse_date(value, expected):
+    assert _parse_date(value) == expected
+
+def _connect_args(postgres_url) -> dict:
+    return dict(
+        host=postgres_url.host or postgres_url.query.get("host"),
+        port=postgres_url.port or 5432,
+        database=postgres_url.database,
+        user=postgres_url.username,
+        password=postgres_url.password or ""
+    )
+
+def _run_cluster_query(postgres_url, timeline, **kwargs):
+    """Load timeline rows into a throwaway schema and run find_spatial_temporal_clusters against it."""
+    schema = f"test_{uuid.uuid4().hex[:12]}"
+    connect_args = _connect_args(postgres_url)
+    
+    async def run():
+        connection = await asyncpg.connect(**connect_args)
+        try:
+            await connection.execute(f"""
+                CREATE SCHEMA {schema};
+                CREATE TABLE {schema}.patient_infection_timeline (
+                    patient_id VARCHAR(50), infection VARCHAR(100), infection_date DATE,
+                    location VARCHAR(100), ward_in_time DATE, ward_out_time DATE, infection_during_stay BOOLEAN
+                )
+            """)
+            await connection.executemany(
+                f"INSERT INTO {schema}.patient_infection_timeline VALUES ($1, $2, $3, $4, $5, $6, $7)", timeline
+            )
+            
+            db_manager = DatabaseManager(
+                host=connect_args["host"], port=connect_args["port"], database=connect_args["database"],
+                username=connect_args["user"], password=connect_args["password"], schema=schema
+            )
+            await db_manager.connect()
+            try:
+                return await ClusterQueryBuilder(db_manager).find_spatial_temporal_clusters("CRE", **kwargs)
+            finally:
+                await db_manager.disconnect()
+        finally:
+            await connection.execute(f"DROP SCHEMA {schema} CASCADE")
+            await connection.close()
+    
+    return asyncio.run(run())
+
+DAY = date(2024, 3, 1)
+
+# P1, P2 and P5 overlap in ICU with infections 3-10 days apart; P3 overlaps too but tests positive a month later
+CLUSTER_TIMELINE = [
+    ('P1', 'CRE', DAY, 'ICU', DAY - timedelta(days=2), DAY + timedelta(days=20), True),
+    ('P2', 'CRE', DAY + timedelta(days=3), 'ICU', DAY, DAY + timedelta(days=15), True),
+    ('P5', 'CRE', DAY + timedelta(days=10), 'ICU', DAY + timedelta(days=5), DAY + timedelta(days=12), True),
+    ('P3', 'CRE', DAY + timedelta(days=40), 'ICU', DAY, DAY + timedelta(days=45), True),
+    ('P4', 'CRE', DAY, 'Ward B', DAY, DAY + timedelta(days=5), True),
+    ('P6', 'MRSA', DAY, 'ICU', DAY, DAY + timedelta(days=5), True),
+]
+
+def test_find_spatial_temporal_clusters_counts_distinct_patients(postgres_url):
+    rows = _run_cluster_query(postgres_url, CLUSTER_TIMELINE, contact_window_days=14, min_cluster_size=2)
+    
+    assert [dict(row) for row in rows] == [{
+        'location': 'ICU',
+        'cluster_size': 3,
+        'cluster_start': DAY,
+        'cluster_end': DAY + timedelta(days=10),
+        'cluster_duration_days': 11,
+        'avg_days_between_infections': Decimal('6.7')
+    }]
+
+def test_find_spatial_temporal_clusters_respects_window_and_min_size(postgres_url):
+    assert _run_cluster_query(postgres_url, CLUSTER_TIMELINE, contact_window_days=2, min_cluster_size=2) == []
+    assert _run_cluster_query(postgres_url, CLUSTER_TIMELINE, contact_window_days=14, min_cluster_size=4) == []
+
+def test_parse_date_memoizes_non_iso_values():
+    _parse_non_iso_date.cache_clear()
+    
+    for _ in range(1000):
+        assert _parse_date("01/02/2024") == date(2024, 1, 2)
+    
+    assert _parse_non_iso_date.cache_info().misses == 1
+
+def test_concurrent_patient_inserts_do_not_deadlock(postgres_url):
+    """Both loaders upsert overlapping patient sets at once; unordered sets deadlocked most rounds."""
+    schema = f"test_{uuid.uuid4().hex[:12]}"
+    connect_args = _connect_args(postgres_url)
+    rng = random.Random(0)
+    patient_ids = [f"P{n}" for n in range(20_000)]
+    
+    async def run():
+        connection = await asyncpg.connect(**connect_args)
+        await connection.execute(f"CREATE SCHEMA {schema}; CREATE TABLE {schema}.patients (patient_id VARCHAR(50) PRIMARY KEY)")
+        db_manager = DatabaseManager(
+            host=connect_args["host"], port=connect_args["port"], database=connect_args["database"],
+            username=connect_args["user"], password=connect_args["password"], schema=schema
+        )
+        try:
+            await db_manager.connect()
+            loader = CSVDataLoader(db_manager)
+            for _ in range(10):
+                # Different set sizes give different iteration orders over the shared IDs
+                transfers_ids = set(rng.sample(patient_ids, 15_000))
+                microbiology_ids = set(rng.sample(patient_ids, 3_000))
+                await asyncio.gather(loader._insert_patients(transfers_ids), loader._insert_patients(microbiology_ids))
+                
+                assert await connection.fetchval(f"SELECT COUNT(*) FROM {schema}.patients") == len(transfers_ids | microbiology_ids)
+                await connection.execute(f"TRUNCATE {schema}.patients")
+        finally:
+            await db_manager.disconnect()
+            await connection.execute(f"DROP SCHEMA {schema} CASCADE")
+            await connection.close()
+    
+    asyncio.run(run())